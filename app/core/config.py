@@ -12,6 +12,7 @@ class Settings(BaseSettings):
     # Qdrant (Docker / local)
     QDRANT_HOST: str
     QDRANT_PORT: int
+    QDRANT_GRPC_PORT: int = 6334
     QDRANT_COLLECTION_NAME: str
 
     # Embedding API
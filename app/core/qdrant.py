@@ -5,7 +5,16 @@ from qdrant_client import QdrantClient
 from app.core.config import get_settings
 
 
-def create_qdrant_client() -> QdrantClient:
-    """Create a Qdrant client (host/port for Docker or local)."""
+def create_qdrant_client(prefer_grpc: bool = False) -> QdrantClient:
+    """Create a Qdrant client (host/port for Docker or local).
+
+    prefer_grpc switches data calls to the gRPC port, which sends vectors as
+    protobuf floats instead of JSON; used by the bulk ingestion scripts.
+    """
     settings = get_settings()
-    return QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+    return QdrantClient(
+        host=settings.QDRANT_HOST,
+        port=settings.QDRANT_PORT,
+        grpc_port=settings.QDRANT_GRPC_PORT,
+        prefer_grpc=prefer_grpc,
+    )
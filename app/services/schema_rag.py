@@ -48,7 +48,10 @@ async def retrieve_schema_context(
         collection_names = [c.name for c in collections]
         logger.info("Schema RAG: Available collections: %s", collection_names)
         
-        if not any(c.name == SQL_AGENT_COLLECTION for c in collections):
+        # The loader publishes the collection under an alias when it rebuilds it.
+        if not any(c.name == SQL_AGENT_COLLECTION for c in collections) and not any(
+            a.alias_name == SQL_AGENT_COLLECTION for a in qdrant.get_aliases().aliases
+        ):
             error_msg = (
                 f"Collection '{SQL_AGENT_COLLECTION}' not found in Qdrant. "
                 f"Run 'python scripts/load_sql_schema_embeddings.py' to populate it."
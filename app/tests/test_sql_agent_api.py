@@ -82,3 +82,29 @@ async def test_schema_rag_fallback_without_collection() -> None:
     context = await retrieve_schema_context("how many orders", settings, mock_qdrant)
     assert "ticket" in context or "customer_id" in context
     assert len(context) > 100
+
+
+@pytest.mark.asyncio
+async def test_schema_rag_accepts_sql_agent_alias() -> None:
+    """A sql-agent alias (published by the loader on rebuild) counts as the collection."""
+    from types import SimpleNamespace
+    from unittest.mock import AsyncMock, MagicMock, patch
+
+    from app.core.config import get_settings
+    from app.services.schema_rag import retrieve_schema_context
+
+    settings = get_settings()
+    mock_qdrant = MagicMock()
+    mock_qdrant.get_collections.return_value.collections = []
+    mock_qdrant.get_aliases.return_value.aliases = [
+        SimpleNamespace(alias_name="sql-agent", collection_name="sql-agent-20260101000000")
+    ]
+    mock_qdrant.query_points.return_value.points = [
+        SimpleNamespace(payload={"content": "Table ticket: id, customer_id", "type": "table"}, score=0.9)
+    ]
+
+    with patch("app.services.schema_rag.embed_query", AsyncMock(return_value=[0.1, 0.2])):
+        context = await retrieve_schema_context("how many orders", settings, mock_qdrant)
+
+    assert mock_qdrant.query_points.call_args.kwargs["collection_name"] == "sql-agent"
+    assert "Table ticket: id, customer_id" in context
@@ -2,20 +2,33 @@
 """
 Load CSV files from data/csv files/ and insert into the database using Prisma.
 Run from project root. Requires: prisma generate, DATABASE_URL set, and migrations applied.
+
+Each CSV is described by a LoaderSpec in SPECS; specs are run level by level in
+foreign-key dependency order. The large fact tables (ccpayment, product, ticket,
+ticket_item) bypass Prisma and are streamed with COPY over raw asyncpg connections.
 """
+import argparse
 import asyncio
 import csv
+import operator
 import os
 import sys
+import threading
+import traceback
+from dataclasses import dataclass
 from datetime import datetime
 from decimal import Decimal
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import asyncpg
+from dotenv import load_dotenv
 
 # Add project root so prisma can be imported
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 os.chdir(PROJECT_ROOT)
+load_dotenv()  # DATABASE_URL for the raw asyncpg connection
 
 try:
     from prisma import Prisma
@@ -31,11 +44,7 @@ try:
         CcentryMethod,
         Customer,
         Employee,
-        Ccpayment,
         CcpaymentCard,
-        Product,
-        Ticket,
-        TicketItem,
     )
 except (AttributeError, ImportError):
     print(
@@ -47,14 +56,59 @@ except (AttributeError, ImportError):
     )
     sys.exit(1)
 
+try:
+    # Optional: parses the large fact tables (and their int/decimal/timestamp
+    # columns) in C. Without it every table goes through the csv module path.
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    ARROW_TYPES = {
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        # Amounts are read as text and built by parse_decimal: pa.decimal128
+        # rejects values with more fractional digits than its scale, which
+        # Decimal accepts and Postgres rounds.
+        "decimal": pa.string(),
+        "timestamp": pa.timestamp("us"),
+        "string": pa.string(),
+    }
+except ImportError:
+    pa = pa_csv = None
+    ARROW_TYPES = {}
+
 DATA_DIR = PROJECT_ROOT / "data" / "csv files"
+# Recreate DDL for --fast-reload, kept on disk until the constraints are back.
+RESTORE_DDL_PATH = PROJECT_ROOT / ".cache" / "fast_reload_restore.sql"
+
+# Rows per insert/COPY round-trip, and how many parsed chunks may wait in memory.
+CHUNK_SIZE = 5000
+QUEUE_DEPTH = 4
+READ_BUFFER_SIZE = 1 << 20
+_END = object()
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y")
 
 
 def parse_date(s: str):
     if not s or not s.strip():
         return None
     s = s.strip()
-    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y"):
+    # Fast path: the CSV exports use fixed-width layouts, so pick the format from
+    # the string shape. ISO dates/timestamps go through the C-level
+    # datetime.fromisoformat; DD/MM/YYYY is sliced directly.
+    n = len(s)
+    try:
+        if n == 10:
+            if s[4] == "-" and s[7] == "-":
+                return datetime.fromisoformat(s)
+            if s[2] == "/" and s[5] == "/":
+                return datetime(int(s[6:10]), int(s[3:5]), int(s[0:2]))
+        elif n == 19 and s[4] == "-" and s[10] == " ":
+            return datetime.fromisoformat(s)
+    except ValueError:
+        pass
+    # Slow path for non-padded values such as "1/2/2020".
+    for fmt in DATE_FORMATS:
         try:
             return datetime.strptime(s, fmt)
         except ValueError:
@@ -62,249 +116,568 @@ def parse_date(s: str):
     raise ValueError(f"Cannot parse date: {s!r}")
 
 
+_ZERO = Decimal("0")
+# Amount columns repeat heavily (0.00, common prices/taxes); Decimal is immutable,
+# so equal strings can share one instance. Bounded to keep memory flat.
+_DECIMAL_CACHE: Dict[str, Decimal] = {}
+_DECIMAL_CACHE_MAX = 4096
+
+
 def parse_decimal(s: str) -> Optional[Decimal]:
-    if s is None or (isinstance(s, str) and not s.strip()):
+    if s is None:
         return None
-    return Decimal(str(s).strip())
+    s = s.strip() if isinstance(s, str) else str(s)
+    if not s:
+        return None
+    d = _DECIMAL_CACHE.get(s)
+    if d is None:
+        d = Decimal(s)
+        if len(_DECIMAL_CACHE) < _DECIMAL_CACHE_MAX:
+            _DECIMAL_CACHE[s] = d
+    return d
+
+
+def _s(v: Optional[str]) -> Optional[str]:
+    """Strip an optional CSV cell, mapping missing/blank values to None."""
+    return (v.strip() or None) if v else None
+
+
+# Expression templates for make_xform; ``{v}`` is a positional row cell.
+_CONVERTERS = {
+    "str": "{v}",
+    "opt_str": "{v}.strip() or None",
+    "int": "int({v})",
+    "opt_int": "int({v}) if {v}.strip() else None",
+    "decimal": "parse_decimal({v}) or _ZERO",
+    "date": "parse_date({v})",
+}
+
+
+def make_xform(
+    convs: Sequence[str], keys: Optional[Sequence[str]] = None
+) -> Callable[[Tuple[str, ...]], Any]:
+    """Compile a row transform specialised for one table.
+
+    ``convs`` names a converter per positional cell. With ``keys`` the generated
+    function returns a Prisma create dict, otherwise a COPY record tuple. The
+    body is a single literal with inlined index accesses and conversions, so no
+    per-row helper calls or branching on the column layout remain.
+    """
+    exprs = [_CONVERTERS[conv].format(v=f"r[{i}]") for i, conv in enumerate(convs)]
+    if keys is None:
+        body = "(" + ", ".join(exprs) + ",)"
+    else:
+        body = "{" + ", ".join(f"{key!r}: {expr}" for key, expr in zip(keys, exprs)) + "}"
+    namespace = {"parse_decimal": parse_decimal, "parse_date": parse_date, "_ZERO": _ZERO}
+    exec(compile(f"def xform(r):\n    return {body}\n", "<xform>", "exec"), namespace)
+    return namespace["xform"]
+
+
+def iter_csv_positional(
+    path: Path, cols: Sequence[str], optional: Sequence[str] = ()
+) -> Iterator[Tuple[str, ...]]:
+    """Yield CSV rows as tuples ordered like ``cols``.
+
+    Column positions are resolved from the header once and picked with a single
+    ``itemgetter`` call per row, so rows are plain tuples instead of per-row
+    dicts. Columns listed in ``optional`` may be missing from the header and
+    then read as an empty string, as do trailing fields a row leaves out.
+    """
+    # Large read buffer: fewer read syscalls and decoder round-trips on big files.
+    # utf-8-sig drops a BOM so the first header name still matches.
+    with open(path, newline="", encoding="utf-8-sig", buffering=READ_BUFFER_SIZE) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        pad = len(header)
+        idx = []
+        for col in cols:
+            if col in header:
+                idx.append(header.index(col))
+            elif col in optional:
+                idx.append(pad)
+            else:
+                raise KeyError(f"{path.name}: missing column {col!r}")
+        # Rows are padded to the header width, plus one cell for missing
+        # optional columns.
+        width = pad + 1 if pad in idx else pad
+        pick = operator.itemgetter(*idx)
+        single = len(idx) == 1
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < width:
+                row.extend([""] * (width - len(row)))
+            yield (pick(row),) if single else pick(row)
+
+
+def load_typed(
+    path: Path,
+    types: Dict[str, Any],
+    zero_fill: Sequence[str] = (),
+    optional: Sequence[str] = (),
+    decimals: Sequence[str] = (),
+) -> Iterator[tuple]:
+    """Parse ``path`` with pyarrow, converting each column in ``types`` in C.
+
+    Only the listed columns are read; ``decimals`` columns are then turned into
+    Decimal with parse_decimal. Columns in ``optional`` may be missing
+    from the header and come back as None, as do empty cells (nulls in
+    ``zero_fill`` columns become 0 instead); any other missing column raises
+    KeyError, as in iter_csv_positional. Yields tuples in ``types`` order,
+    built column-wise rather than per-row dict; the file is read on the first
+    ``next()``, so this can run in a worker thread.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), None)
+    if header is None:
+        return
+    for col in types:
+        if col not in header and col not in optional:
+            raise KeyError(f"{path.name}: missing column {col!r}")
+    table = pa_csv.read_csv(
+        path,
+        convert_options=pa_csv.ConvertOptions(
+            column_types=types,
+            include_columns=list(types),
+            include_missing_columns=True,
+            strings_can_be_null=True,
+            timestamp_parsers=[pa_csv.ISO8601, "%d/%m/%Y"],
+        ),
+    )
+    columns = []
+    for name in types:
+        values = table.column(name).to_pylist()
+        if name in decimals:
+            values = list(map(parse_decimal, values))
+        if name in zero_fill:
+            values = [_ZERO if v is None else v for v in values]
+        columns.append(values)
+    yield from zip(*columns)
+
+
+async def copy_insert(
+    pool: "asyncpg.Pool",
+    table: str,
+    columns: Sequence[str],
+    records: List[tuple],
+    skip_duplicates: bool = True,
+) -> int:
+    """Bulk-load ``records`` into ``table`` and return the number of new rows.
+
+    Without ``skip_duplicates`` the rows are COPYed straight into ``table``.
+    Otherwise they are COPYed into a temporary staging table and moved with
+    ``ON CONFLICT DO NOTHING``, which keeps the skip-duplicates behaviour of
+    create_many (COPY itself has no conflict handling).
+    """
+    async with pool.acquire() as conn:
+        if not skip_duplicates:
+            status = await conn.copy_records_to_table(table, records=records, columns=list(columns))
+            return int(status.rsplit(" ", 1)[-1])
+        stage = f"_stage_{table}"
+        cols = ", ".join(f'"{c}"' for c in columns)
+        async with conn.transaction():
+            await conn.execute(f'CREATE TEMP TABLE "{stage}" (LIKE "{table}" INCLUDING DEFAULTS) ON COMMIT DROP')
+            await conn.copy_records_to_table(stage, records=records, columns=list(columns))
+            status = await conn.execute(
+                f'INSERT INTO "{table}" ({cols}) SELECT {cols} FROM "{stage}" ON CONFLICT DO NOTHING'
+            )
+    return int(status.rsplit(" ", 1)[-1])
+
+
+def create_many_inserter(
+    actions: Any, skip_duplicates: bool = True
+) -> Callable[[List[Dict[str, Any]]], Awaitable[int]]:
+    """Return a chunk inserter bound to a model's Prisma actions object.
+
+    ``Model.prisma(prisma)`` is resolved once per table by the caller instead of
+    once per chunk.
+    """
+    create_many = actions.create_many
+    return lambda batch: create_many(data=batch, skip_duplicates=skip_duplicates)
+
 
+async def load_pipelined(
+    rows: Iterable[Any],
+    insert: Callable[[List[Any]], Awaitable[int]],
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    """Insert ``rows`` chunk by chunk while the next chunk is still being parsed.
 
-def load_csv(path: Path) -> List[Dict[str, str]]:
-    with open(path, newline="", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
+    ``rows`` is iterated in a worker thread (so lazy CSV reading/transforming
+    runs there) and chunks are handed over through a bounded queue; ``insert``
+    is awaited for each chunk on the event loop. Returns the summed counts.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_DEPTH)
+    stop = threading.Event()
 
+    def put(item: Any) -> None:
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
 
-async def main():
+    def produce() -> None:
+        try:
+            # Chunks have a fixed size, so fill a preallocated list by index
+            # rather than growing it with append.
+            buf = [None] * chunk_size
+            i = 0
+            for row in rows:
+                buf[i] = row
+                i += 1
+                if i == chunk_size:
+                    if stop.is_set():
+                        return
+                    put(buf)
+                    buf = [None] * chunk_size
+                    i = 0
+            if i and not stop.is_set():
+                put(buf[:i])
+        finally:
+            put(_END)
+
+    worker = asyncio.ensure_future(asyncio.to_thread(produce))
+    total = 0
+    try:
+        while (batch := await queue.get()) is not _END:
+            total += await insert(batch)
+    finally:
+        # On an insert error, unblock a producer waiting on a full queue.
+        stop.set()
+        while not worker.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.wait({worker}, timeout=0.05)
+    await worker
+    return total
+
+
+@dataclass(frozen=True)
+class LoaderSpec:
+    """How one CSV file is read and inserted.
+
+    ``xform`` turns a positional row tuple (ordered like ``columns``) into a Prisma
+    create dict, or into a record tuple ordered like ``copy_columns`` when the
+    table is loaded with COPY (``model`` None). ``table`` is the database table
+    name. ``arrow`` gives a pyarrow type name per column for tables parsed by
+    load_typed.
+    """
+
+    label: str
+    filename: str
+    table: str
+    columns: Tuple[str, ...]
+    xform: Callable[[Tuple[str, ...]], Any]
+    model: Any = None
+    copy_columns: Tuple[str, ...] = ()
+    optional: Tuple[str, ...] = ()
+    arrow: Tuple[str, ...] = ()
+    zero_fill: Tuple[str, ...] = ()
+    arrow_xform: Optional[Callable[[tuple], tuple]] = None
+    deps: Tuple[str, ...] = ()
+
+
+PERSON_CONVS = ("int", "str", "str", "date", "opt_str", "opt_str")
+PERSON_FIELDS = ("id", "firstname", "lastname", "dob", "email", "phoneno")
+
+SPECS = [
+    # --- Lookup / reference (no FKs) ---
+    LoaderSpec(
+        "Category", "category.csv", "category", ("CATEGORY_ID", "CATEGORY_NAME"),
+        make_xform(("int", "str"), ("id", "name")),
+        model=Category,
+    ),
+    LoaderSpec(
+        "Type", "type.csv", "type", ("TYPE_ID", "TYPE_NAME", "CATEGORY_ID"),
+        make_xform(("int", "str", "int"), ("id", "name", "categoryId")),
+        model=Type, deps=("Category",),
+    ),
+    LoaderSpec(
+        "Size", "size.csv", "size", ("SIZE_CODE", "DESCRIPTION"),
+        make_xform(("str", "opt_str"), ("code", "description")),
+        model=Size, optional=("DESCRIPTION",),
+    ),
+    LoaderSpec(
+        "Color", "color.csv", "color", ("COLOR_CODE", "COLOR_NAME"),
+        make_xform(("str", "str"), ("code", "name")),
+        model=Color,
+    ),
+    LoaderSpec(
+        "Gender", "gender.csv", "gender", ("GENDER_ID", "GENDER_NAME"),
+        make_xform(("int", "str"), ("id", "name")),
+        model=Gender,
+    ),
+    LoaderSpec(
+        "Brand", "brand.csv", "brand", ("BRAND_ID", "BRAND_NAME", "EMAIL"),
+        make_xform(("int", "str", "opt_str"), ("id", "name", "email")),
+        model=Brand, optional=("EMAIL",),
+    ),
+    LoaderSpec(
+        "CcpaymentType", "ccpayment_type.csv", "ccpayment_type", ("CCTYPE", "DESCRIPTION"),
+        make_xform(("str", "opt_str"), ("code", "description")),
+        model=CcpaymentType, optional=("DESCRIPTION",),
+    ),
+    LoaderSpec(
+        "CcpaymentState", "ccpayment_state.csv", "ccpayment_state", ("CCSTATE", "DESCRIPTION"),
+        make_xform(("int", "opt_str"), ("code", "description")),
+        model=CcpaymentState, optional=("DESCRIPTION",),
+    ),
+    LoaderSpec(
+        "CcentryMethod", "ccentry_method.csv", "ccentry_method", ("CCMETHOD", "DESCRIPTION"),
+        make_xform(("int", "opt_str"), ("code", "description")),
+        model=CcentryMethod, optional=("DESCRIPTION",),
+    ),
+    # --- People ---
+    LoaderSpec(
+        "Customer", "customer.csv", "customer", ("CUSTOMER_ID", "FIRSTNAME", "LASTNAME", "DOB", "EMAIL", "PHONENO"),
+        make_xform(PERSON_CONVS, PERSON_FIELDS),
+        model=Customer, optional=("EMAIL", "PHONENO"),
+    ),
+    LoaderSpec(
+        "Employee", "employee.csv", "employee", ("EMPLOYEE_ID", "FIRSTNAME", "LASTNAME", "DOB", "EMAIL", "PHONENO"),
+        make_xform(PERSON_CONVS, PERSON_FIELDS),
+        model=Employee, optional=("EMAIL", "PHONENO"),
+    ),
+    # --- Payments ---
+    LoaderSpec(
+        "Ccpayment", "ccpayment.csv", "ccpayment",
+        (
+            "CCPAYMENT_ID", "CCPAYTRAN_ID", "EXPECTED_AMOUNT", "APPROVING_AMOUNT",
+            "APPROVED_AMOUNT", "CCPAYMENT_STATE", "TIMECREATED", "TIMEUPDATED", "TIMEEXPIRED",
+        ),
+        make_xform(("int", "opt_int", "decimal", "decimal", "decimal", "int", "date", "date", "date")),
+        copy_columns=(
+            "id", "ccpaytran_id", "expected_amount", "approving_amount", "approved_amount",
+            "ccpayment_state", "timecreated", "timeupdated", "timeexpired",
+        ),
+        optional=("CCPAYTRAN_ID",),
+        arrow=("int64", "int64", "decimal", "decimal", "decimal", "int32", "timestamp", "timestamp", "timestamp"),
+        zero_fill=("EXPECTED_AMOUNT", "APPROVING_AMOUNT", "APPROVED_AMOUNT"),
+        deps=("CcpaymentState",),
+    ),
+    LoaderSpec(
+        "CcpaymentCard", "ccpayment_card.csv", "ccpayment_card",
+        (
+            "CCPAYMENT_ID", "PAYMENT_TYPE", "IS_ENCRYPT", "CARD_NUMBER",
+            "BANKNAME", "CCEXPDATE", "CCENTRY_METHOD",
+        ),
+        make_xform(
+            ("int", "str", "opt_str", "opt_str", "opt_str", "opt_int", "int"),
+            ("paymentId", "paymentTypeCode", "isEncrypt", "cardNumber", "bankName", "ccExpDate", "ccentryMethodId"),
+        ),
+        model=CcpaymentCard,
+        optional=("IS_ENCRYPT", "CARD_NUMBER", "BANKNAME", "CCEXPDATE"),
+        deps=("Ccpayment", "CcpaymentType", "CcentryMethod"),
+    ),
+    # --- Product ---
+    LoaderSpec(
+        "Product", "product.csv", "product",
+        (
+            "PRODUCT_ID", "TYPE_ID", "SIZE_CODE", "COLOR_CODE",
+            "PRODUCT_NAME", "BRAND_ID", "GENDER_ID", "DESCRIPTION",
+        ),
+        make_xform(("int", "int", "str", "str", "str", "int", "int", "opt_str")),
+        copy_columns=(
+            "id", "type_id", "size_code", "color_code", "product_name", "brand_id", "gender_id", "description",
+        ),
+        optional=("DESCRIPTION",),
+        arrow=("int32", "int32", "string", "string", "string", "int32", "int32", "string"),
+        arrow_xform=lambda row: row[:7] + (_s(row[7]),),
+        deps=("Type", "Size", "Color", "Brand", "Gender"),
+    ),
+    # --- Ticket ---
+    LoaderSpec(
+        "Ticket", "ticket.csv", "ticket",
+        (
+            "TICKET_ID", "TIMEPLACED", "EMPLOYEE_ID", "CUSTOMER_ID",
+            "TOTAL_PRODUCT", "TOTAL_TAX", "TOTAL_ORDER", "CCPAYMENT_ID",
+        ),
+        make_xform(("int", "date", "int", "int", "decimal", "decimal", "decimal", "int")),
+        copy_columns=(
+            "id", "timeplaced", "employee_id", "customer_id",
+            "total_product", "total_tax", "total_order", "ccpayment_id",
+        ),
+        arrow=("int64", "timestamp", "int32", "int32", "decimal", "decimal", "decimal", "int64"),
+        zero_fill=("TOTAL_PRODUCT", "TOTAL_TAX", "TOTAL_ORDER"),
+        deps=("Employee", "Customer", "Ccpayment"),
+    ),
+    # --- TicketItem (composite key) ---
+    LoaderSpec(
+        "TicketItem", "ticket_item.csv", "ticket_item",
+        ("TICKET_ID", "NUMSEQ", "PRODUCT_ID", "QUANTITY", "PRICE", "TAX_AMOUNT", "PRODUCT_AMOUNT"),
+        make_xform(("int", "int", "int", "decimal", "decimal", "decimal", "decimal")),
+        copy_columns=(
+            "ticket_id", "numseq", "product_id", "quantity", "price", "tax_amount", "product_amount",
+        ),
+        arrow=("int64", "int32", "int32", "decimal", "decimal", "decimal", "decimal"),
+        zero_fill=("QUANTITY", "PRICE", "TAX_AMOUNT", "PRODUCT_AMOUNT"),
+        deps=("Ticket", "Product"),
+    ),
+]
+
+
+def dependency_levels(specs: Sequence[LoaderSpec]) -> List[List[LoaderSpec]]:
+    """Group specs into levels whose dependencies are all in earlier levels."""
+    done: set = set()
+    remaining = list(specs)
+    levels = []
+    while remaining:
+        level = [spec for spec in remaining if all(dep in done for dep in spec.deps)]
+        if not level:
+            raise ValueError(f"Unresolvable loader dependencies: {[spec.label for spec in remaining]}")
+        levels.append(level)
+        done.update(spec.label for spec in level)
+        remaining = [spec for spec in remaining if spec not in level]
+    return levels
+
+
+def write_restore_ddl(ddl: Sequence[str]) -> None:
+    RESTORE_DDL_PATH.parent.mkdir(parents=True, exist_ok=True)
+    RESTORE_DDL_PATH.write_text("".join(f"{stmt};\n" for stmt in ddl))
+
+
+async def drop_constraints(pool: "asyncpg.Pool", tables: Sequence[str]) -> List[str]:
+    """Drop FK constraints and non-unique indexes on ``tables``.
+
+    Returns the DDL that recreates them, which is written to RESTORE_DDL_PATH
+    before anything is dropped. FKs come back as NOT VALID and are checked by a
+    separate VALIDATE. Primary keys and unique indexes stay, since the
+    ON CONFLICT / skip_duplicates paths depend on them.
+    """
+    async with pool.acquire() as conn, conn.transaction():
+        fkeys = await conn.fetch(
+            """
+            SELECT conrelid::regclass::text AS tbl, conname, pg_get_constraintdef(oid) AS def
+            FROM pg_constraint
+            WHERE contype = 'f' AND conrelid = ANY($1::text[]::regclass[])
+            """,
+            list(tables),
+        )
+        indexes = await conn.fetch(
+            """
+            SELECT indexrelid::regclass::text AS idx, pg_get_indexdef(indexrelid) AS def
+            FROM pg_index
+            WHERE NOT indisunique AND indrelid = ANY($1::text[]::regclass[])
+            """,
+            list(tables),
+        )
+        # Indexes first so FK validation and later lookups run against built indexes.
+        ddl = [ix["def"] for ix in indexes]
+        for fk in fkeys:
+            ddl.append(f'ALTER TABLE {fk["tbl"]} ADD CONSTRAINT "{fk["conname"]}" {fk["def"]} NOT VALID')
+            ddl.append(f'ALTER TABLE {fk["tbl"]} VALIDATE CONSTRAINT "{fk["conname"]}"')
+        write_restore_ddl(ddl)
+        for fk in fkeys:
+            await conn.execute(f'ALTER TABLE {fk["tbl"]} DROP CONSTRAINT "{fk["conname"]}"')
+        for ix in indexes:
+            await conn.execute(f"DROP INDEX {ix['idx']}")
+    return ddl
+
+
+async def restore_constraints(pool: "asyncpg.Pool", ddl: Sequence[str]) -> List[str]:
+    """Run the DDL from drop_constraints, each statement in its own transaction.
+
+    A failing statement does not undo the others. An FK whose VALIDATE finds
+    orphan rows stays in place as NOT VALID, so new rows are still checked.
+    Returns the failed statements; RESTORE_DDL_PATH is rewritten to hold just
+    those, or removed once everything is back.
+    """
+    failed = []
+    async with pool.acquire() as conn:
+        for stmt in ddl:
+            try:
+                await conn.execute(stmt)
+            except asyncpg.PostgresError as e:
+                print(f"Restore failed: {e}", file=sys.stderr)
+                failed.append(stmt)
+    if failed:
+        write_restore_ddl(failed)
+    else:
+        RESTORE_DDL_PATH.unlink(missing_ok=True)
+    return failed
+
+
+async def load_spec(spec: LoaderSpec, prisma: Prisma, pool: "asyncpg.Pool", files: set) -> None:
+    if spec.filename not in files:
+        return
+    path = DATA_DIR / spec.filename
+    if spec.arrow and pa_csv is not None:
+        types = {col: ARROW_TYPES[name] for col, name in zip(spec.columns, spec.arrow)}
+        decimals = [col for col, name in zip(spec.columns, spec.arrow) if name == "decimal"]
+        rows = load_typed(path, types, spec.zero_fill, spec.optional, decimals)
+        if spec.arrow_xform is not None:
+            rows = map(spec.arrow_xform, rows)
+    else:
+        rows = map(spec.xform, iter_csv_positional(path, spec.columns, spec.optional))
+
+    # A table that starts empty cannot conflict with existing rows, so the
+    # ON CONFLICT check (and, for COPY, the staging table) is only paid on
+    # incremental loads.
+    if spec.model is not None:
+        actions = spec.model.prisma(prisma)
+        empty = await actions.count() == 0
+        insert = create_many_inserter(actions, skip_duplicates=not empty)
+    else:
+        empty = not await pool.fetchval(f'SELECT EXISTS (SELECT 1 FROM "{spec.table}")')
+
+        def insert(batch: List[tuple]) -> Awaitable[int]:
+            return copy_insert(pool, spec.table, spec.copy_columns, batch, skip_duplicates=not empty)
+
+    count = await load_pipelined(rows, insert)
+    print(f"{spec.label}: {count}")
+
+
+async def main(fast_reload: bool = False):
     if not DATA_DIR.is_dir():
         print(f"Data directory not found: {DATA_DIR}")
         sys.exit(1)
 
     prisma = Prisma()
     await prisma.connect()
+    pool = await asyncpg.create_pool(os.environ["DATABASE_URL"], min_size=1, max_size=4)
 
+    restore: List[str] = []
+    failed: List[str] = []
     try:
-        # --- Lookup / reference (no FKs) ---
-        path = DATA_DIR / "category.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [{"id": int(r["CATEGORY_ID"]), "name": r["CATEGORY_NAME"]} for r in rows]
-            count = await Category.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"Category: {count}")
-
-        path = DATA_DIR / "type.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {"id": int(r["TYPE_ID"]), "name": r["TYPE_NAME"], "categoryId": int(r["CATEGORY_ID"])}
-                for r in rows
-            ]
-            count = await Type.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"Type: {count}")
-
-        path = DATA_DIR / "size.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {"code": r["SIZE_CODE"], "description": (r.get("DESCRIPTION") or "").strip() or None}
-                for r in rows
-            ]
-            count = await Size.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"Size: {count}")
-
-        path = DATA_DIR / "color.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [{"code": r["COLOR_CODE"], "name": r["COLOR_NAME"]} for r in rows]
-            count = await Color.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"Color: {count}")
-
-        path = DATA_DIR / "gender.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [{"id": int(r["GENDER_ID"]), "name": r["GENDER_NAME"]} for r in rows]
-            count = await Gender.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"Gender: {count}")
-
-        path = DATA_DIR / "brand.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {
-                    "id": int(r["BRAND_ID"]),
-                    "name": r["BRAND_NAME"],
-                    "email": (r.get("EMAIL") or "").strip() or None,
-                }
-                for r in rows
-            ]
-            count = await Brand.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"Brand: {count}")
-
-        path = DATA_DIR / "ccpayment_type.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {"code": r["CCTYPE"], "description": (r.get("DESCRIPTION") or "").strip() or None}
-                for r in rows
-            ]
-            count = await CcpaymentType.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"CcpaymentType: {count}")
-
-        path = DATA_DIR / "ccpayment_state.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {"code": int(r["CCSTATE"]), "description": (r.get("DESCRIPTION") or "").strip() or None}
-                for r in rows
-            ]
-            count = await CcpaymentState.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"CcpaymentState: {count}")
-
-        path = DATA_DIR / "ccentry_method.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {"code": int(r["CCMETHOD"]), "description": (r.get("DESCRIPTION") or "").strip() or None}
-                for r in rows
-            ]
-            count = await CcentryMethod.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"CcentryMethod: {count}")
-
-        # --- People ---
-        path = DATA_DIR / "customer.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {
-                    "id": int(r["CUSTOMER_ID"]),
-                    "firstname": r["FIRSTNAME"],
-                    "lastname": r["LASTNAME"],
-                    "dob": parse_date(r["DOB"]),
-                    "email": (r.get("EMAIL") or "").strip() or None,
-                    "phoneno": (r.get("PHONENO") or "").strip() or None,
-                }
-                for r in rows
-            ]
-            count = await Customer.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"Customer: {count}")
-
-        path = DATA_DIR / "employee.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {
-                    "id": int(r["EMPLOYEE_ID"]),
-                    "firstname": r["FIRSTNAME"],
-                    "lastname": r["LASTNAME"],
-                    "dob": parse_date(r["DOB"]),
-                    "email": (r.get("EMAIL") or "").strip() or None,
-                    "phoneno": (r.get("PHONENO") or "").strip() or None,
-                }
-                for r in rows
-            ]
-            count = await Employee.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"Employee: {count}")
-
-        # --- Payments ---
-        path = DATA_DIR / "ccpayment.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {
-                    "id": int(r["CCPAYMENT_ID"]),
-                    "ccpayTranId": int(r["CCPAYTRAN_ID"]) if (r.get("CCPAYTRAN_ID") or "").strip() else None,
-                    "expectedAmount": parse_decimal(r["EXPECTED_AMOUNT"]) or Decimal("0"),
-                    "approvingAmount": parse_decimal(r["APPROVING_AMOUNT"]) or Decimal("0"),
-                    "approvedAmount": parse_decimal(r["APPROVED_AMOUNT"]) or Decimal("0"),
-                    "ccpaymentStateId": int(r["CCPAYMENT_STATE"]),
-                    "timeCreated": parse_date(r["TIMECREATED"]),
-                    "timeUpdated": parse_date(r["TIMEUPDATED"]),
-                    "timeExpired": parse_date(r["TIMEEXPIRED"]),
-                }
-                for r in rows
-            ]
-            count = await Ccpayment.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"Ccpayment: {count}")
-
-        path = DATA_DIR / "ccpayment_card.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {
-                    "paymentId": int(r["CCPAYMENT_ID"]),
-                    "paymentTypeCode": r["PAYMENT_TYPE"],
-                    "isEncrypt": (r.get("IS_ENCRYPT") or "").strip() or None,
-                    "cardNumber": (r.get("CARD_NUMBER") or "").strip() or None,
-                    "bankName": (r.get("BANKNAME") or "").strip() or None,
-                    "ccExpDate": int(r["CCEXPDATE"]) if (r.get("CCEXPDATE") or "").strip() else None,
-                    "ccentryMethodId": int(r["CCENTRY_METHOD"]),
-                }
-                for r in rows
-            ]
-            count = await CcpaymentCard.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"CcpaymentCard: {count}")
-
-        # --- Product ---
-        path = DATA_DIR / "product.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {
-                    "id": int(r["PRODUCT_ID"]),
-                    "typeId": int(r["TYPE_ID"]),
-                    "sizeCode": r["SIZE_CODE"],
-                    "colorCode": r["COLOR_CODE"],
-                    "name": r["PRODUCT_NAME"],
-                    "brandId": int(r["BRAND_ID"]),
-                    "genderId": int(r["GENDER_ID"]),
-                    "description": (r.get("DESCRIPTION") or "").strip() or None,
-                }
-                for r in rows
-            ]
-            count = await Product.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"Product: {count}")
-
-        # --- Ticket ---
-        path = DATA_DIR / "ticket.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {
-                    "id": int(r["TICKET_ID"]),
-                    "timePlaced": parse_date(r["TIMEPLACED"]),
-                    "employeeId": int(r["EMPLOYEE_ID"]),
-                    "customerId": int(r["CUSTOMER_ID"]),
-                    "totalProduct": parse_decimal(r["TOTAL_PRODUCT"]) or Decimal("0"),
-                    "totalTax": parse_decimal(r["TOTAL_TAX"]) or Decimal("0"),
-                    "totalOrder": parse_decimal(r["TOTAL_ORDER"]) or Decimal("0"),
-                    "ccpaymentId": int(r["CCPAYMENT_ID"]),
-                }
-                for r in rows
-            ]
-            count = await Ticket.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"Ticket: {count}")
-
-        # --- TicketItem (composite key) ---
-        path = DATA_DIR / "ticket_item.csv"
-        if path.exists():
-            rows = load_csv(path)
-            data = [
-                {
-                    "ticketId": int(r["TICKET_ID"]),
-                    "numSeq": int(r["NUMSEQ"]),
-                    "productId": int(r["PRODUCT_ID"]),
-                    "quantity": parse_decimal(r["QUANTITY"]) or Decimal("0"),
-                    "price": parse_decimal(r["PRICE"]) or Decimal("0"),
-                    "taxAmount": parse_decimal(r["TAX_AMOUNT"]) or Decimal("0"),
-                    "productAmount": parse_decimal(r["PRODUCT_AMOUNT"]) or Decimal("0"),
-                }
-                for r in rows
-            ]
-            count = await TicketItem.prisma(prisma).create_many(data=data, skip_duplicates=True)
-            print(f"TicketItem: {count}")
-
+        if fast_reload:
+            restore = await drop_constraints(pool, [spec.table for spec in SPECS])
+            print(f"Dropped constraints/indexes for fast reload; recreate DDL saved to {RESTORE_DDL_PATH}")
+        # One directory listing instead of a stat per CSV.
+        files = {entry.name for entry in os.scandir(DATA_DIR) if entry.is_file()}
+        # Tables within a level have no FKs on each other, so they load concurrently.
+        for level in dependency_levels(SPECS):
+            await asyncio.gather(*(load_spec(spec, prisma, pool, files) for spec in level))
         print("Done.")
     finally:
+        if restore:
+            # Never raise from here: a load error must not be replaced by a restore error.
+            try:
+                failed = await restore_constraints(pool, restore)
+            except Exception:
+                traceback.print_exc()
+                failed = restore
+            if failed:
+                print(
+                    f"Could not restore {len(failed)} of {len(restore)} statements; "
+                    f"run them manually (also saved to {RESTORE_DDL_PATH}):",
+                    file=sys.stderr,
+                )
+                for stmt in failed:
+                    print(f"{stmt};", file=sys.stderr)
+            else:
+                print("Restored constraints/indexes")
+        await pool.close()
         await prisma.disconnect()
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Load CSV data into PostgreSQL via Prisma")
+    parser.add_argument(
+        "--fast-reload",
+        action="store_true",
+        help="Drop FK constraints and secondary indexes during the load and rebuild them afterwards",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(fast_reload=args.fast_reload))
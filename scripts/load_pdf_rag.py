@@ -5,12 +5,18 @@ Handles FAQ + Guides + Training Manuals + Decision Logic
 """
 
 import argparse
+import hashlib
 import logging
 import os
+import queue
 import sys
+import threading
 import uuid
 import re
 import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -23,13 +29,29 @@ from docx import Document as DocxDocument
 from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, PointStruct, VectorParams, OptimizersConfigDiff
+from qdrant_client.models import (
+    Distance,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    MatchValue,
+    OptimizersConfigDiff,
+    PointStruct,
+    VectorParams,
+)
+
+try:
+    import pypdfium2 as pdfium  # C-backed PDF text extraction, much faster than pypdf
+except ImportError:
+    pdfium = None
 
 from app.core.config import get_settings
 from app.core.qdrant import create_qdrant_client
 
 DATA_DIR = PROJECT_ROOT / "data" / "Pdfs1"
 BATCH_EMBED_SIZE = 32
+EMBED_CONCURRENCY = 8  # embedding requests in flight at once
+UPSERT_QUEUE_DEPTH = 4  # embedded batches waiting for Qdrant
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
@@ -41,12 +63,19 @@ logger = logging.getLogger(__name__)
 class EmbeddingClient:
     def __init__(self, url: str):
         self.url = url.rstrip("/")
+        # One pooled client for every batch (and thread), so connections are kept alive.
+        self._client = httpx.Client(
+            timeout=120.0,
+            limits=httpx.Limits(max_connections=EMBED_CONCURRENCY, max_keepalive_connections=EMBED_CONCURRENCY),
+        )
+
+    def close(self):
+        self._client.close()
 
     def embed_batch(self, texts):
-        with httpx.Client(timeout=120.0) as client:
-            r = client.post(self.url, json={"text": texts})
-            r.raise_for_status()
-            data = r.json()
+        r = self._client.post(self.url, json={"text": texts})
+        r.raise_for_status()
+        data = r.json()
 
         if "embedding" in data:
             emb = data["embedding"]
@@ -64,25 +93,64 @@ class EmbeddingClient:
 
 def load_docx_structured(path: Path):
     doc = DocxDocument(path)
-    parts = []
-
-    for p in doc.paragraphs:
-        if p.text.strip():
-            parts.append(p.text.strip())
+    # .text is rebuilt from runs on every access, so read and strip it once.
+    parts = [t for t in (p.text.strip() for p in doc.paragraphs) if t]
 
     for table in doc.tables:
         for row in table.rows:
-            row_text = " | ".join(cell.text.strip() for cell in row.cells if cell.text.strip())
+            row_text = " | ".join(t for t in (cell.text.strip() for cell in row.cells) if t)
             if row_text:
                 parts.append(row_text)
 
     full_text = "\n".join(parts)
     return [Document(page_content=full_text, metadata={"source": str(path)})]
 
-def load_document(path: Path):
-    if path.suffix.lower() == ".pdf":
+def load_pdf(path: Path):
+    """One Document per page, like PyPDFLoader, extracted with pdfium when available."""
+    if pdfium is None:
         return PyPDFLoader(str(path)).load()
-    if path.suffix.lower() == ".docx":
+    pdf = pdfium.PdfDocument(str(path))
+    try:
+        docs = []
+        for i, page in enumerate(pdf):
+            textpage = page.get_textpage()
+            text = textpage.get_text_range().replace("\r\n", "\n")
+            textpage.close()
+            page.close()
+            docs.append(Document(page_content=text, metadata={"source": str(path), "page": i}))
+        return docs
+    finally:
+        pdf.close()
+
+def detect_file_type(path: Path):
+    """Return "pdf" or "docx" from the file's magic bytes, or None."""
+    with open(path, "rb") as f:
+        head = f.read(5)
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(path) as z:
+                if "word/document.xml" in z.namelist():
+                    return "docx"
+        except zipfile.BadZipFile:
+            pass
+    return None
+
+def file_sha1(path: Path) -> str:
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):  # Python 3.11+: hashed in C without Python-level reads
+            return hashlib.file_digest(f, "sha1").hexdigest()
+        h = hashlib.sha1()
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+        return h.hexdigest()
+
+def load_document(path: Path):
+    kind = detect_file_type(path)
+    if kind == "pdf":
+        return load_pdf(path)
+    if kind == "docx":
         return load_docx_structured(path)
     raise ValueError("Unsupported file")
 
@@ -90,11 +158,16 @@ def load_document(path: Path):
 # SPLITTERS
 # -----------------------------------------------------------------------------
 
+# The question may not run past the next Q:/A: line and the answer stops at the
+# next "\nQ:", so a Q: without an answer fails fast instead of rescanning the
+# rest of the document.
 FAQ_PATTERN = re.compile(
-    r"(?:Q[:\-]\s*)(?P<q>.*?)(?:\n|\r\n)+(?:A[:\-]\s*)(?P<a>.*?)(?=\nQ[:\-]|\Z)",
+    r"Q[:\-]\s*(?P<q>[^\n]*(?:\n(?![AQ][:\-])[^\n]*)*?)\n+A[:\-]\s*(?P<a>(?:(?!\nQ[:\-]).)*)",
     re.DOTALL | re.IGNORECASE,
 )
 
+PARA_SPLIT = re.compile(r"\n\s*\n")
+
 HEADING_SPLIT = re.compile(r"\n(?=[A-Z][^\n]{3,80}\n)", re.MULTILINE)
 
 KNOWLEDGE_BLOCK_SPLIT = re.compile(
@@ -113,6 +186,11 @@ KNOWLEDGE_BLOCK_SPLIT = re.compile(
 # CHUNKING LOGIC
 # -----------------------------------------------------------------------------
 
+def first_line(text: str, limit: int = 120) -> str:
+    """First line of text, capped at limit chars, without splitting the whole block."""
+    nl = text.find("\n")
+    return text[:nl if 0 <= nl < limit else limit]
+
 def semantic_chunk_documents(docs, source, filename):
     now = datetime.now(timezone.utc).isoformat()
     chunks = []
@@ -123,7 +201,7 @@ def semantic_chunk_documents(docs, source, filename):
         # ---------- FAQ ----------
         for i, m in enumerate(FAQ_PATTERN.finditer(text)):
             chunks.append({
-                "id": str(uuid.uuid4()),
+                "id": uuid.uuid4().hex,
                 "content": m.group("a").strip(),
                 "metadata": {
                     "title": m.group("q").strip(),
@@ -143,10 +221,10 @@ def semantic_chunk_documents(docs, source, filename):
                 if len(block) < 80:
                     continue
 
-                title = block.split("\n")[0][:120]
+                title = first_line(block)
 
                 chunks.append({
-                    "id": str(uuid.uuid4()),
+                    "id": uuid.uuid4().hex,
                     "content": block,
                     "metadata": {
                         "title": title,
@@ -169,10 +247,10 @@ def semantic_chunk_documents(docs, source, filename):
                 continue
 
             meaningful += 1
-            title = section.split("\n")[0][:120]
+            title = first_line(section)
 
             chunks.append({
-                "id": str(uuid.uuid4()),
+                "id": uuid.uuid4().hex,
                 "content": section,
                 "metadata": {
                     "title": title,
@@ -186,10 +264,10 @@ def semantic_chunk_documents(docs, source, filename):
 
         # ---------- FALLBACK ----------
         if meaningful == 0:
-            paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text) if len(p.strip()) > 150]
+            paragraphs = [p.strip() for p in PARA_SPLIT.split(text) if len(p.strip()) > 150]
             for i, para in enumerate(paragraphs):
                 chunks.append({
-                    "id": str(uuid.uuid4()),
+                    "id": uuid.uuid4().hex,
                     "content": para,
                     "metadata": {
                         "title": para[:80],
@@ -221,18 +299,123 @@ def ensure_collection(client: QdrantClient, name: str, dim: int, recreate: bool)
         )
         logger.info("Created collection")
 
-def wait_for_indexing(client: QdrantClient, collection: str):
+def is_ingested(client: QdrantClient, collection: str, digest: str) -> bool:
+    # Every chunk records how many chunks its file produced, so a file cut
+    # short by an interrupted run does not count as ingested.
+    file_filter = Filter(must=[FieldCondition(key="file_sha1", match=MatchValue(value=digest))])
+    points, _ = client.scroll(collection, scroll_filter=file_filter, limit=1, with_payload=["file_chunks"])
+    if not points or "file_chunks" not in points[0].payload:
+        return False
+    stored = client.count(collection, count_filter=file_filter, exact=True).count
+    return stored == points[0].payload["file_chunks"]
+
+def delete_file_chunks(client: QdrantClient, collection: str, filename: str):
+    client.delete(
+        collection,
+        points_selector=FilterSelector(
+            filter=Filter(must=[FieldCondition(key="filename", match=MatchValue(value=filename))])
+        ),
+    )
+
+def wait_for_indexing(client: QdrantClient, collection: str, timeout_seconds: int = 60):
     logger.info("Building vector index...")
 
     client.update_collection(collection_name=collection, optimizers_config=OptimizersConfigDiff(indexing_threshold=1))
 
-    for _ in range(60):
+    for _ in range(timeout_seconds):
         info = client.get_collection(collection)
         logger.info("Index progress %d/%d", info.indexed_vectors_count, info.points_count)
-        if info.indexed_vectors_count >= info.points_count and info.points_count > 0:
+        if info.indexed_vectors_count >= info.points_count:
             logger.info("Semantic search READY")
             return
         time.sleep(1)
+    logger.warning("Indexing may still be in progress after %ds", timeout_seconds)
+
+class UpsertWorker:
+    """Upserts point batches on a background thread so Qdrant writes overlap embedding.
+
+    Batches are sent with wait=False (Qdrant acknowledges on receipt), except
+    the last one: it is held back until close() and sent with wait=True.
+    Qdrant applies updates in order, so once it returns every earlier batch
+    has been applied too.
+    """
+
+    def __init__(self, client: QdrantClient, collection: str):
+        self.client = client
+        self.collection = collection
+        self._queue = queue.Queue(maxsize=UPSERT_QUEUE_DEPTH)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="qdrant-upsert", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        held = None
+        while (points := self._queue.get()) is not None:
+            if self._error is not None:
+                continue  # keep draining so put() never blocks after a failure
+            try:
+                if held is not None:
+                    self.client.upsert(self.collection, held, wait=False)
+                held = points
+            except Exception as e:
+                self._error = e
+        if held is not None and self._error is None:
+            try:
+                self.client.upsert(self.collection, held, wait=True)
+            except Exception as e:
+                self._error = e
+
+    def put(self, points):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(points)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+class ChunkBatcher:
+    """Packs chunks from consecutive files into full embedding batches.
+
+    Small files (a few FAQ answers) no longer produce undersized requests. Up to
+    EMBED_CONCURRENCY batches are embedded at once; results are shipped to the
+    upserter in submission order.
+    """
+
+    def __init__(self, embedder: EmbeddingClient, pool: ThreadPoolExecutor, upserter: UpsertWorker):
+        self.embedder = embedder
+        self.pool = pool
+        self.upserter = upserter
+        self._pending = []
+        self._in_flight = deque()
+
+    def add(self, chunks):
+        self._pending.extend(chunks)
+        while len(self._pending) >= BATCH_EMBED_SIZE:
+            self._submit(self._pending[:BATCH_EMBED_SIZE])
+            del self._pending[:BATCH_EMBED_SIZE]
+
+    def flush(self):
+        if self._pending:
+            self._submit(self._pending)
+            self._pending = []
+        while self._in_flight:
+            self._ship()
+
+    def _submit(self, batch):
+        future = self.pool.submit(self.embedder.embed_batch, [c["content"] for c in batch])
+        self._in_flight.append((batch, future))
+        while len(self._in_flight) > EMBED_CONCURRENCY:
+            self._ship()
+
+    def _ship(self):
+        batch, future = self._in_flight.popleft()
+        self.upserter.put([
+            PointStruct(id=c["id"], vector=v, payload={"content": c["content"], **c["metadata"]})
+            for c, v in zip(batch, future.result())
+        ])
 
 # -----------------------------------------------------------------------------
 # MAIN
@@ -244,16 +427,28 @@ def main():
     args = parser.parse_args()
 
     settings = get_settings()
-    client = create_qdrant_client()
+    client = create_qdrant_client(prefer_grpc=True)
     embedder = EmbeddingClient(settings.EMBEDDING_URL)
 
     ensure_collection(client, settings.QDRANT_COLLECTION_NAME, settings.EMBEDDING_DIMENSION, args.recreate)
 
     files = list(DATA_DIR.glob("*.pdf")) + list(DATA_DIR.glob("*.docx"))
     total = 0
+    pool = ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY)
+    upserter = UpsertWorker(client, settings.QDRANT_COLLECTION_NAME)
+    batcher = ChunkBatcher(embedder, pool, upserter)
 
     for file in files:
+        # Chunks carry the SHA-1 of their source file, so unchanged files are
+        # skipped on re-runs instead of being re-embedded.
+        digest = file_sha1(file)
+        if is_ingested(client, settings.QDRANT_COLLECTION_NAME, digest):
+            logger.info("Skipping %s (unchanged)", file.name)
+            continue
+
         logger.info("Processing %s", file.name)
+        # Drop chunks from an earlier version of this file before re-adding it.
+        delete_file_chunks(client, settings.QDRANT_COLLECTION_NAME, file.name)
 
         docs = load_document(file)
         chunks = semantic_chunk_documents(docs, str(file), file.name)
@@ -262,18 +457,19 @@ def main():
             logger.warning("No content extracted from %s", file.name)
             continue
 
-        texts = [c["content"] for c in chunks]
-        vectors = []
-
-        for i in range(0, len(texts), BATCH_EMBED_SIZE):
-            vectors.extend(embedder.embed_batch(texts[i:i+BATCH_EMBED_SIZE]))
+        for c in chunks:
+            c["metadata"]["file_sha1"] = digest
+            c["metadata"]["file_chunks"] = len(chunks)
 
-        points = [PointStruct(id=c["id"], vector=v, payload={"content": c["content"], **c["metadata"]}) for c, v in zip(chunks, vectors)]
-        client.upsert(settings.QDRANT_COLLECTION_NAME, points)
+        batcher.add(chunks)
 
-        total += len(points)
-        logger.info("Inserted %d chunks", len(points))
+        total += len(chunks)
+        logger.info("Queued %d chunks", len(chunks))
 
+    batcher.flush()
+    pool.shutdown()
+    embedder.close()
+    upserter.close()
     wait_for_indexing(client, settings.QDRANT_COLLECTION_NAME)
     logger.info("DONE — %d knowledge chunks indexed", total)
 
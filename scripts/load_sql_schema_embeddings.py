@@ -7,59 +7,382 @@ schema changes) to enable RAG-based schema retrieval in the SQL Agent API.
 """
 
 import argparse
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
 import logging
+import os
+import random
+import sqlite3
 import sys
 import time
+from collections import Counter
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any, Optional
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
-os.chdir(PROJECT_ROOT)
 
 import httpx
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional: request and response bodies fall back to the json module
+    orjson = None
+
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, PointStruct, VectorParams, OptimizersConfigDiff
+from qdrant_client.models import (
+    CollectionStatus,
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    Distance,
+    HnswConfigDiff,
+    OptimizersConfigDiff,
+    PointIdsList,
+    PointStruct,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    VectorParams,
+)
 
 from app.core.config import get_settings
 from app.core.qdrant import create_qdrant_client
 from app.services.schema_chunker import generate_all_chunks
 
 COLLECTION_NAME = "sql-agent"
-BATCH_EMBED_SIZE = 16
+BATCH_EMBED_SIZE = 32  # upper bound on texts per request
+EMBED_TOKEN_BUDGET = 8192  # estimated tokens per request (~4 characters each)
+EMBED_CONCURRENCY = 8  # embedding requests in flight at once
+UPSERT_BATCH_SIZE = 256  # points per Qdrant upsert request
+UPSERT_WORKERS = 2
+UPSERT_QUEUE_DEPTH = 4  # point batches waiting for Qdrant
+EMBED_MAX_ATTEMPTS = 5
+CACHE_PATH = PROJECT_ROOT / ".cache" / "schema_embeddings.sqlite"
+CACHE_LOOKUP_SIZE = 500  # keys per SELECT ... IN (...), below SQLite's variable limit
+SCROLL_PAGE_SIZE = 1000
+GZIP_MIN_BYTES = 4096  # smaller request bodies are sent uncompressed even with --gzip
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 
-def _embed_batch(url: str, texts: list[str]) -> list[list[float]]:
+def _dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj).encode()
+
+
+def _loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+async def _post_with_retry(
+    client: httpx.AsyncClient, url: str, payload: dict, compress: bool = False
+) -> httpx.Response:
+    """POST ``payload`` as JSON, retrying transport errors, 429 and 5xx with exponential backoff.
+
+    A numeric Retry-After header from the server takes precedence over the backoff delay.
+    With ``compress``, bodies of at least GZIP_MIN_BYTES are gzipped once and
+    sent with Content-Encoding: gzip; the server must decode it.
+    """
+    body = _dumps(payload)
+    headers = {"Content-Type": "application/json"}
+    if compress and len(body) >= GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    for attempt in range(EMBED_MAX_ATTEMPTS):
+        delay = 2**attempt + random.random()
+        try:
+            r = await client.post(url, content=body, headers=headers)
+        except httpx.TransportError as e:
+            if attempt == EMBED_MAX_ATTEMPTS - 1:
+                raise
+            logger.warning("Embedding request failed (%s); retrying in %.1fs", e, delay)
+        else:
+            if (r.status_code != 429 and r.status_code < 500) or attempt == EMBED_MAX_ATTEMPTS - 1:
+                r.raise_for_status()
+                return r
+            retry_after = r.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = float(retry_after)
+            logger.warning("Embedding endpoint returned %d; retrying in %.1fs", r.status_code, delay)
+        await asyncio.sleep(delay)
+
+
+def _to_array(vectors: list) -> np.ndarray:
+    """Stack embeddings into a float32 matrix; base64 strings are decoded without per-float objects."""
+    if vectors and isinstance(vectors[0], str):
+        raw = b"".join(base64.b64decode(v) for v in vectors)
+        return np.frombuffer(raw, dtype=np.float32).reshape(len(vectors), -1)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+async def _embed_batch(
+    client: httpx.AsyncClient, url: str, texts: list[str], compress: bool = False, base64_output: bool = False
+) -> np.ndarray:
+    """Embed ``texts``; returns one float32 row per text.
+
+    The request body is ``{"text": [...]}``. With ``base64_output`` it also asks
+    for base64 float32 output; services that ignore the hint and return float
+    lists are handled too.
+    """
     if not texts:
-        return []
-    with httpx.Client(timeout=120.0) as client:
-        r = client.post(url.rstrip("/"), json={"text": texts})
-        r.raise_for_status()
-        data = r.json()
+        return np.empty((0, 0), dtype=np.float32)
+    payload: dict[str, Any] = {"text": texts}
+    if base64_output:
+        payload["encoding_format"] = "base64"
+    r = await _post_with_retry(client, url.rstrip("/"), payload, compress)
+    data = _loads(r.content)
     if "embedding" in data:
         emb = data["embedding"]
-        return emb if isinstance(emb[0], list) else [emb]
+        return _to_array([emb] if isinstance(emb, str) or not isinstance(emb[0], (list, str)) else emb)
     if "embeddings" in data:
-        return data["embeddings"]
+        return _to_array(data["embeddings"])
     if "data" in data:
-        return [d["embedding"] for d in data["data"]]
+        return _to_array([d["embedding"] for d in data["data"]])
     raise ValueError("Unknown embedding response")
 
 
-def ensure_collection(client: QdrantClient, name: str, dim: int, recreate: bool) -> None:
-    collections = [c.name for c in client.get_collections().collections]
-    if recreate and name in collections:
-        client.delete_collection(name)
-        logger.info("Deleted existing collection %s", name)
-    if name not in collections or recreate:
-        client.create_collection(
-            collection_name=name,
-            vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
-            optimizers_config=OptimizersConfigDiff(indexing_threshold=0),
+def pack_batches(items: list[tuple[dict, bytes]]) -> list[list[tuple[dict, bytes]]]:
+    """Greedily group (chunk, cache key) pairs into batches within EMBED_TOKEN_BUDGET and BATCH_EMBED_SIZE.
+
+    Items should be sorted by content length so each request holds similarly
+    sized texts and the server pads less. A chunk larger than the budget on
+    its own still gets a batch of its own.
+    """
+    batches: list[list[tuple[dict, bytes]]] = []
+    current: list[tuple[dict, bytes]] = []
+    tokens = 0
+    for item in items:
+        estimate = len(item[0]["content"]) // 4
+        if current and (tokens + estimate > EMBED_TOKEN_BUDGET or len(current) == BATCH_EMBED_SIZE):
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(item)
+        tokens += estimate
+    if current:
+        batches.append(current)
+    return batches
+
+
+class EmbeddingCache:
+    """SQLite store of vectors keyed by a blake2b hash of the embedding URL and text.
+
+    Vectors are kept as float32 bytes. Rows whose dimension differs from the
+    one requested are ignored, so a model change simply misses the cache.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS emb (h BLOB PRIMARY KEY, v BLOB, dim INT)")
+
+    @staticmethod
+    def key(url: str, text: str) -> bytes:
+        return hashlib.blake2b(f"{url}\0{text}".encode(), digest_size=16).digest()
+
+    def get_many(self, keys: list[bytes], dim: int) -> dict[bytes, np.ndarray]:
+        found = {}
+        for i in range(0, len(keys), CACHE_LOOKUP_SIZE):
+            part = keys[i : i + CACHE_LOOKUP_SIZE]
+            rows = self._conn.execute(
+                f"SELECT h, v FROM emb WHERE dim = ? AND h IN ({', '.join('?' * len(part))})", (dim, *part)
+            )
+            for h, v in rows:
+                found[h] = np.frombuffer(v, dtype=np.float32)
+        return found
+
+    def put_many(self, keys: list[bytes], vectors: np.ndarray) -> None:
+        """Store the float32 rows of ``vectors`` under ``keys``."""
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO emb (h, v, dim) VALUES (?, ?, ?)",
+                [(h, vec.tobytes(), vectors.shape[1]) for h, vec in zip(keys, vectors)],
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def assign_point_ids(chunks: list[dict]) -> None:
+    """Set a stable 63-bit integer ``point_id`` on each chunk.
+
+    The chunker issues random UUIDs, so the id is a blake2b hash of the chunk's
+    metadata (minus indexed_at) instead, with chunks sharing metadata told apart
+    by their order. Re-runs on the same schema overwrite points instead of
+    duplicating them.
+    """
+    seen: Counter = Counter()
+    for c in chunks:
+        key = json.dumps({k: v for k, v in c["metadata"].items() if k != "indexed_at"}, sort_keys=True)
+        seen[key] += 1
+        digest = hashlib.blake2b(f"{key}#{seen[key]}".encode(), digest_size=8).digest()
+        c["point_id"] = int.from_bytes(digest, "big") & ((1 << 63) - 1)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def existing_hashes(client: QdrantClient, collection: str) -> dict:
+    """Map point id -> stored content_hash for every point in ``collection``."""
+    hashes = {}
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection, limit=SCROLL_PAGE_SIZE, offset=offset, with_payload=["content_hash"], with_vectors=False
         )
-        logger.info("Created collection %s (dim=%d)", name, dim)
+        for p in points:
+            hashes[p.id] = (p.payload or {}).get("content_hash")
+        if offset is None:
+            return hashes
+
+
+def _to_points(chunks: list[dict], vectors: np.ndarray) -> list[PointStruct]:
+    # PointStruct validates vectors as lists of floats, so the float32 batch is
+    # converted once here, per batch, rather than held as lists throughout.
+    return [
+        PointStruct(
+            id=c["point_id"],
+            vector=vec,
+            payload={
+                "content": c["content"],
+                "chunk_id": c["id"],
+                "content_hash": c["content_hash"],
+                **c["metadata"],
+            },
+        )
+        for c, vec in zip(chunks, vectors.tolist())
+    ]
+
+
+async def ingest(
+    client: QdrantClient,
+    collection: str,
+    url: str,
+    chunks: list[dict],
+    dim: int,
+    cache: EmbeddingCache,
+    compress: bool = False,
+    base64_output: bool = False,
+) -> int:
+    """Embed and upsert ``chunks`` through a queue pipeline; return the number of points sent.
+
+    Chunks with a cached vector go straight to the upsert queue. The rest are
+    length-sorted, packed into batches and embedded by EMBED_CONCURRENCY
+    workers whose results are upserted by UPSERT_WORKERS while later batches
+    are still embedding, so only a few batches of points exist at a time.
+    Fresh vectors are written in place into one preallocated float32 buffer,
+    each batch into its own slice, and stay arrays until the points are built.
+    Each upsert worker sends its last batch with wait=True; Qdrant applies
+    updates in order, so once the pipeline returns every point has been applied.
+    """
+    keys = [EmbeddingCache.key(url, c["content"]) for c in chunks]
+    cached = cache.get_many(keys, dim)
+    misses = sorted(
+        ((c, key) for c, key in zip(chunks, keys) if key not in cached), key=lambda item: len(item[0]["content"])
+    )
+    logger.info("Embedding cache: %d hits, %d misses", len(chunks) - len(misses), len(misses))
+
+    q_embed: asyncio.Queue = asyncio.Queue()
+    q_upsert: asyncio.Queue = asyncio.Queue(maxsize=UPSERT_QUEUE_DEPTH)
+    buffer = np.empty((len(misses), dim), dtype=np.float32)
+    embedded = 0
+
+    async def embed_worker(http: httpx.AsyncClient) -> None:
+        nonlocal embedded
+        while (item := await q_embed.get()) is not None:
+            start, batch = item
+            batch_chunks = [c for c, _ in batch]
+            result = await _embed_batch(http, url, [c["content"] for c in batch_chunks], compress, base64_output)
+            if result.shape != (len(batch), dim):
+                raise ValueError(
+                    f"Embedding API returned shape {result.shape} for {len(batch)} texts of dimension {dim}"
+                )
+            vectors = buffer[start : start + len(batch)]
+            vectors[:] = result
+            cache.put_many([key for _, key in batch], vectors)
+            embedded += len(batch)
+            logger.info("Embedded %d/%d", embedded, len(misses))
+            await q_upsert.put(_to_points(batch_chunks, vectors))
+
+    async def upsert_worker() -> None:
+        held = None
+        while (points := await q_upsert.get()) is not None:
+            if held is not None:
+                await asyncio.to_thread(client.upsert, collection, held, wait=False)
+            held = points
+        if held is not None:
+            await asyncio.to_thread(client.upsert, collection, held, wait=True)
+
+    async def produce(embedders: list[asyncio.Task]) -> None:
+        start = 0
+        for batch in pack_batches(misses):
+            q_embed.put_nowait((start, batch))
+            start += len(batch)
+        for _ in embedders:
+            q_embed.put_nowait(None)
+        hits = [(c, cached[key]) for c, key in zip(chunks, keys) if key in cached]
+        for i in range(0, len(hits), UPSERT_BATCH_SIZE):
+            part = hits[i : i + UPSERT_BATCH_SIZE]
+            await q_upsert.put(_to_points([c for c, _ in part], np.stack([vec for _, vec in part])))
+        await asyncio.gather(*embedders)
+        for _ in range(UPSERT_WORKERS):
+            await q_upsert.put(None)
+
+    limits = httpx.Limits(max_connections=EMBED_CONCURRENCY, max_keepalive_connections=EMBED_CONCURRENCY)
+    async with httpx.AsyncClient(timeout=120.0, limits=limits) as http:
+        embedders = [asyncio.create_task(embed_worker(http)) for _ in range(EMBED_CONCURRENCY)]
+        tasks = embedders + [asyncio.create_task(upsert_worker()) for _ in range(UPSERT_WORKERS)]
+        tasks.append(asyncio.create_task(produce(embedders)))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+    return len(chunks)
+
+
+def create_collection(client: QdrantClient, name: str, dim: int) -> None:
+    # Sized for a few hundred schema chunks: a sparse HNSW graph, int8
+    # vectors kept in RAM for search, and the large text payload on disk.
+    client.create_collection(
+        collection_name=name,
+        vectors_config=VectorParams(size=dim, distance=Distance.COSINE, on_disk=False),
+        hnsw_config=HnswConfigDiff(m=8, ef_construct=64, full_scan_threshold=512),
+        quantization_config=ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, always_ram=True),
+        ),
+        on_disk_payload=True,
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=0),
+    )
+    logger.info("Created collection %s (dim=%d)", name, dim)
+
+
+def resolve_alias(client: QdrantClient, alias: str) -> Optional[str]:
+    for a in client.get_aliases().aliases:
+        if a.alias_name == alias:
+            return a.collection_name
+    return None
+
+
+def publish_alias(client: QdrantClient, alias: str, collection: str, previous: Optional[str]) -> None:
+    """Point ``alias`` at ``collection`` in one atomic alias update."""
+    operations = []
+    if previous is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    elif client.collection_exists(alias):
+        # A plain collection from before aliases were used holds the name.
+        client.delete_collection(alias)
+        logger.info("Deleted legacy collection %s", alias)
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection, alias_name=alias)))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    logger.info("Alias %s -> %s", alias, collection)
 
 
 def wait_for_indexing(client: QdrantClient, collection: str, timeout_seconds: int = 60) -> None:
@@ -68,13 +391,21 @@ def wait_for_indexing(client: QdrantClient, collection: str, timeout_seconds: in
         collection_name=collection,
         optimizers_config=OptimizersConfigDiff(indexing_threshold=1),
     )
-    for _ in range(timeout_seconds):
+    # Poll with backoff (0.1s growing to 2s) so small collections return quickly.
+    delay = 0.1
+    deadline = time.monotonic() + timeout_seconds
+    while True:
         info = client.get_collection(collection)
-        logger.info("Index progress %d/%d", info.indexed_vectors_count, info.points_count)
-        if info.points_count > 0 and info.indexed_vectors_count >= info.points_count:
+        # GREEN means no optimization is pending; ingest has already waited
+        # for its last upserts, so every point is in place.
+        if info.status == CollectionStatus.GREEN:
             logger.info("Semantic search READY")
             return
-        time.sleep(1)
+        if time.monotonic() >= deadline:
+            break
+        logger.info("Collection status %s, %d points", info.status, info.points_count)
+        time.sleep(delay)
+        delay = min(delay * 1.5, 2.0)
     logger.warning("Indexing may still be in progress after %ds", timeout_seconds)
 
 
@@ -82,44 +413,79 @@ def main() -> None:
     parser = argparse.ArgumentParser(
         description="Load schema RAG embeddings into Qdrant (collection: sql-agent) for SQL Agent API."
     )
-    parser.add_argument("--recreate", action="store_true", help="Drop and recreate the collection")
+    parser.add_argument(
+        "--recreate", action="store_true", help="Rebuild into a new collection and swap the alias to it"
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="Gzip large embedding request bodies (the embedding server must accept Content-Encoding: gzip)",
+    )
+    parser.add_argument(
+        "--base64",
+        action="store_true",
+        help='Ask the embedding server for base64 float32 vectors (sends "encoding_format": "base64")',
+    )
     args = parser.parse_args()
 
-    settings = get_settings()
-    client = create_qdrant_client()
+    # Settings load .env from the working directory; change it only while reading them.
+    cwd = os.getcwd()
+    os.chdir(PROJECT_ROOT)
+    try:
+        settings = get_settings()
+        client = create_qdrant_client(prefer_grpc=True)
+    finally:
+        os.chdir(cwd)
     dim = settings.EMBEDDING_DIMENSION
 
-    ensure_collection(client, COLLECTION_NAME, dim, args.recreate)
+    # COLLECTION_NAME is served through an alias. A rebuild loads a fresh
+    # versioned collection and only swaps the alias once it is indexed, so
+    # readers never see a missing or half-filled collection.
+    current = resolve_alias(client, COLLECTION_NAME)
+    rebuild = args.recreate or (current is None and not client.collection_exists(COLLECTION_NAME))
+    if rebuild:
+        collection = f"{COLLECTION_NAME}-{datetime.now(timezone.utc):%Y%m%d%H%M%S}"
+        create_collection(client, collection, dim)
+    else:
+        collection = current or COLLECTION_NAME
 
     chunks = generate_all_chunks()
     if not chunks:
         logger.error("No chunks generated from schema chunker")
         sys.exit(1)
+    assign_point_ids(chunks)
+    for c in chunks:
+        c["content_hash"] = content_hash(c["content"])
 
-    texts = [c["content"] for c in chunks]
-    vectors = []
-    for i in range(0, len(texts), BATCH_EMBED_SIZE):
-        batch = texts[i : i + BATCH_EMBED_SIZE]
-        vectors.extend(_embed_batch(settings.EMBEDDING_URL, batch))
-        logger.info("Embedded batch %d-%d/%d", i + 1, min(i + len(batch), len(texts)), len(texts))
-
-    if len(vectors) != len(chunks):
-        logger.error("Vector count %d != chunk count %d", len(vectors), len(chunks))
-        sys.exit(1)
+    # Only chunks whose content changed since the last run are embedded and
+    # upserted; points no longer produced by the chunker are removed.
+    pending = chunks
+    if not rebuild:
+        existing = existing_hashes(client, collection)
+        pending = [c for c in chunks if existing.get(c["point_id"]) != c["content_hash"]]
+        stale = list(existing.keys() - {c["point_id"] for c in chunks})
+        if stale:
+            client.delete(collection, points_selector=PointIdsList(points=stale))
+        logger.info(
+            "%d chunks unchanged, %d to embed, %d removed", len(chunks) - len(pending), len(pending), len(stale)
+        )
 
-    points = [
-        PointStruct(
-            id=c["id"],
-            vector=vec,
-            payload={"content": c["content"], **c["metadata"]},
+    cache = EmbeddingCache(CACHE_PATH)
+    try:
+        upserted = asyncio.run(
+            ingest(client, collection, settings.EMBEDDING_URL, pending, dim, cache, args.gzip, args.base64)
         )
-        for c, vec in zip(chunks, vectors)
-    ]
-    client.upsert(COLLECTION_NAME, points)
-    logger.info("Upserted %d schema chunks to %s", len(points), COLLECTION_NAME)
+    finally:
+        cache.close()
+    logger.info("Upserted %d schema chunks to %s", upserted, collection)
 
-    wait_for_indexing(client, COLLECTION_NAME)
-    logger.info("DONE — %d schema RAG chunks indexed in %s", len(points), COLLECTION_NAME)
+    wait_for_indexing(client, collection)
+    if rebuild:
+        publish_alias(client, COLLECTION_NAME, collection, current)
+        if current is not None:
+            client.delete_collection(current)
+            logger.info("Deleted previous collection %s", current)
+    logger.info("DONE — %d schema RAG chunks indexed in %s", len(chunks), COLLECTION_NAME)
 
 
 if __name__ == "__main__":
@@ -5,7 +5,9 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+from contextlib import asynccontextmanager
 from datetime import date, datetime
+from typing import AsyncIterator
 
 from prisma import Prisma
 
@@ -18,26 +20,39 @@ def _parse_date(raw: str | None) -> date | None:
     return datetime.strptime(raw, "%Y-%m-%d").date()
 
 
-async def _run(job: str, target_date: date | None) -> None:
+# The weekly job reads the metrics and knowledge gaps the daily job writes, so
+# jobs run one after another in this order rather than concurrently.
+JOB_ORDER = ("daily", "weekly")
+
+
+@asynccontextmanager
+async def prisma_session() -> AsyncIterator[Prisma]:
     prisma = Prisma(auto_register=True)
     await prisma.connect()
     try:
-        if job == "daily":
-            summary = await run_daily_job(prisma, target_date=target_date)
-        else:
-            summary = await run_weekly_job(prisma, window_end=target_date)
+        yield prisma
     finally:
-        if prisma.is_connected():
-            await prisma.disconnect()
-    print(summary)
+        await prisma.disconnect()
+
+
+async def _run(jobs: list[str], target_date: date | None) -> None:
+    async with prisma_session() as prisma:
+        for job in JOB_ORDER:
+            if job not in jobs:
+                continue
+            if job == "daily":
+                summary = await run_daily_job(prisma, target_date=target_date)
+            else:
+                summary = await run_weekly_job(prisma, window_end=target_date)
+            print(summary)
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Run self-learning offline jobs")
-    parser.add_argument("job", choices=["daily", "weekly"], help="Job type to execute")
+    parser.add_argument("jobs", nargs="+", choices=JOB_ORDER, help="Job types to execute on one connection")
     parser.add_argument("--date", dest="date_str", help="Window date in YYYY-MM-DD (UTC)")
     args = parser.parse_args()
-    asyncio.run(_run(args.job, _parse_date(args.date_str)))
+    asyncio.run(_run(args.jobs, _parse_date(args.date_str)))
 
 
 if __name__ == "__main__":